@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from typing import Callable
+
 from flask import Flask, render_template, request
 
 from peano_app.peano import (
@@ -17,11 +19,15 @@ from peano_app.peano import (
     mod_peano,
     gcd_peano,
     make_fraction,
+    PeanoFraction,
     peano_to_fraction,
     simplify_fraction,
     to_display_fraction,
     get_step_count,
     start_trace,
+    fast_math_mode,
+    AXIOMS_LOCK,
+    trusted_input,
     get_negative_flag,
     get_trace_enriched,
     add_fractions,
@@ -31,6 +37,96 @@ from peano_app.peano import (
 )
 
 
+# Operations offered in each input mode
+NATURAL_OPS = frozenset({
+    "successor",
+    "predecessor",
+    "add",
+    "subtract",
+    "multiply",
+    "less_than",
+    "equal",
+    "greater_than",
+    "div",
+    "mod",
+    "gcd",
+    "to_fraction",
+    "simplify_fraction",
+})
+FRACTION_OPS = frozenset({
+    "simplify_fraction_input",
+    "add_fractions",
+    "subtract_fractions",
+    "multiply_fractions",
+    "divide_fractions",
+})
+
+# Natural-number inputs beyond these sizes are evaluated on integer depths
+# (fast_math); their step-by-step derivation is too large to build or show
+FAST_MATH_MAX_OPERAND = 500
+FAST_MATH_MAX_PRODUCT = 10_000
+FAST_MATH_OPS = frozenset({
+    "add", "multiply", "subtract", "equal", "less_than", "greater_than", "div", "mod", "gcd",
+    "simplify_fraction",
+}) | FRACTION_OPS
+# Fraction ops that add or subtract cross products of their components
+SUMMED_FRACTION_OPS = frozenset({"add_fractions", "subtract_fractions"})
+# Hard cap on any operand or result depth: a numeral of depth n is a 3n + 1
+# character string, and it is rendered into the page
+MAX_TERM_DEPTH = 100_000
+
+# Trace display: depth limit, and ops that are implementation details
+# cluttering the formal derivation
+TRACE_MAX_DEPTH = 10
+TRACE_HIDDEN_OPS = frozenset({"predecessor", "successor"})
+
+
+def _display_bool(value: bool) -> dict:
+    return {"peano": str(value), "int": value}
+
+
+def _simplify_ratio(x: str, y: str) -> PeanoFraction:
+    return simplify_fraction(make_fraction(x, y))
+
+
+def _largest_term(op: str, values: list[int]) -> int:
+    """Upper bound on the depth of any numeral ``op`` builds from ``values``."""
+    if op == "successor":
+        return values[0] + 1
+    if op == "add":
+        return sum(values)
+    if op == "multiply":
+        return values[0] * values[1]
+    if op in FRACTION_OPS and op != "simplify_fraction_input":
+        # Cross products, and their sum for add/subtract
+        a, b = sorted(values)[-2:]
+        return (2 if op in SUMMED_FRACTION_OPS else 1) * a * b
+    return max(values)
+
+
+# op -> (function, operand names, label, result renderer)
+OPS: dict[str, tuple[Callable, tuple[str, ...], str, Callable]] = {
+    "successor": (successor, ("x",), "successor", to_display),
+    "predecessor": (predecessor, ("x",), "predecessor", to_display),
+    "add": (add, ("x", "y"), "add", to_display),
+    "multiply": (multiply, ("x", "y"), "multiply", to_display),
+    "subtract": (subtract, ("x", "y"), "subtract (clamped at 0)", to_display),
+    "less_than": (less_than, ("x", "y"), "less than", _display_bool),
+    "equal": (equal, ("x", "y"), "equal", _display_bool),
+    "greater_than": (greater_than, ("x", "y"), "greater than", _display_bool),
+    "div": (div_peano, ("x", "y"), "div", to_display),
+    "mod": (mod_peano, ("x", "y"), "mod", to_display),
+    "gcd": (gcd_peano, ("x", "y"), "gcd", to_display),
+    "to_fraction": (peano_to_fraction, ("x",), "to fraction (X/1)", to_display_fraction),
+    "simplify_fraction": (_simplify_ratio, ("x", "y"), "simplify ratio (X/Y)", to_display_fraction),
+    "simplify_fraction_input": (simplify_fraction, ("x_frac",), "simplify", to_display_fraction),
+    "add_fractions": (add_fractions, ("x_frac", "y_frac"), "add", to_display_fraction),
+    "subtract_fractions": (subtract_fractions, ("x_frac", "y_frac"), "subtract", to_display_fraction),
+    "multiply_fractions": (multiply_fractions, ("x_frac", "y_frac"), "multiply", to_display_fraction),
+    "divide_fractions": (divide_fractions, ("x_frac", "y_frac"), "divide", to_display_fraction),
+}
+
+
 def create_app() -> Flask:
     app = Flask(__name__)
 
@@ -49,213 +145,67 @@ def create_app() -> Flask:
         y_num_raw = request.form.get("y_num", "1")
         y_den_raw = request.form.get("y_den", "1")
 
+        fast_math = False
+
         try:
             x_val = max(0, int(x_raw))
             y_val = max(0, int(y_raw))
 
-            x_peano = int_to_peano_str(x_val)
-            y_peano = int_to_peano_str(y_val)
-
-            # Fractions (if selected)
-            x_num_val = max(0, int(x_num_raw))
-            x_den_val = max(1, int(x_den_raw))
-            y_num_val = max(0, int(y_num_raw))
-            y_den_val = max(1, int(y_den_raw))
-
-            x_frac = make_fraction(int_to_peano_str(x_num_val), int_to_peano_str(x_den_val))
-            y_frac = make_fraction(int_to_peano_str(y_num_val), int_to_peano_str(y_den_val))
-
             # Normalize operation to match input mode
-            natural_ops = {
-                "successor",
-                "predecessor",
-                "add",
-                "subtract",
-                "multiply",
-                "less_than",
-                "equal",
-                "greater_than",
-                "div",
-                "mod",
-                "gcd",
-                "to_fraction",
-                "simplify_fraction",
-            }
-            fraction_ops = {
-                "simplify_fraction_input",
-                "add_fractions",
-                "subtract_fractions",
-                "multiply_fractions",
-                "divide_fractions",
-            }
-            if input_mode == "fraction" and op not in fraction_ops:
+            if input_mode == "fraction" and op not in FRACTION_OPS:
                 op = "multiply_fractions"
-            if input_mode == "natural" and op not in natural_ops:
+            if input_mode == "natural" and op not in NATURAL_OPS:
                 op = "multiply"
 
-            if request.method == "POST":
-                start_trace()
-                if op == "successor":
-                    res_peano = successor(x_peano)
-                    result = {
-                        "operation": "successor",
-                        "x": to_display(x_peano),
-                        "result": to_display(res_peano),
-                    }
-                elif op == "predecessor":
-                    res_peano = predecessor(x_peano)
-                    result = {
-                        "operation": "predecessor",
-                        "x": to_display(x_peano),
-                        "result": to_display(res_peano),
-                    }
-                elif op == "add":
-                    res_peano = add(x_peano, y_peano)
-                    result = {
-                        "operation": "add",
-                        "x": to_display(x_peano),
-                        "y": to_display(y_peano),
-                        "result": to_display(res_peano),
-                    }
-                elif op == "multiply":
-                    res_peano = multiply(x_peano, y_peano)
-                    result = {
-                        "operation": "multiply",
-                        "x": to_display(x_peano),
-                        "y": to_display(y_peano),
-                        "result": to_display(res_peano),
-                    }
-                elif op == "subtract":
-                    res_peano = subtract(x_peano, y_peano)
-                    result = {
-                        "operation": "subtract (clamped at 0)",
-                        "x": to_display(x_peano),
-                        "y": to_display(y_peano),
-                        "result": to_display(res_peano),
-                    }
-                elif op == "less_than":
-                    lt = less_than(x_peano, y_peano)
-                    result = {
-                        "operation": "less than",
-                        "x": to_display(x_peano),
-                        "y": to_display(y_peano),
-                        "result": {"peano": str(lt), "int": lt},
-                    }
-                elif op == "equal":
-                    eq = equal(x_peano, y_peano)
-                    result = {
-                        "operation": "equal",
-                        "x": to_display(x_peano),
-                        "y": to_display(y_peano),
-                        "result": {"peano": str(eq), "int": eq},
-                    }
-                elif op == "greater_than":
-                    gt = greater_than(x_peano, y_peano)
-                    result = {
-                        "operation": "greater than",
-                        "x": to_display(x_peano),
-                        "y": to_display(y_peano),
-                        "result": {"peano": str(gt), "int": gt},
-                    }
-                elif op == "div":
-                    res_peano = div_peano(x_peano, y_peano)
-                    result = {
-                        "operation": "div",
-                        "x": to_display(x_peano),
-                        "y": to_display(y_peano),
-                        "result": to_display(res_peano),
-                    }
-                elif op == "mod":
-                    res_peano = mod_peano(x_peano, y_peano)
-                    result = {
-                        "operation": "mod",
-                        "x": to_display(x_peano),
-                        "y": to_display(y_peano),
-                        "result": to_display(res_peano),
-                    }
-                elif op == "gcd":
-                    res_peano = gcd_peano(x_peano, y_peano)
-                    result = {
-                        "operation": "gcd",
-                        "x": to_display(x_peano),
-                        "y": to_display(y_peano),
-                        "result": to_display(res_peano),
-                    }
-                elif op == "to_fraction":
-                    frac = peano_to_fraction(x_peano)
-                    result = {
-                        "operation": "to fraction (X/1)",
-                        "x": to_display(x_peano),
-                        "result": to_display_fraction(frac),
-                    }
-                elif op == "simplify_fraction":
-                    frac = make_fraction(x_peano, y_peano)
-                    sfrac = simplify_fraction(frac)
-                    result = {
-                        "operation": "simplify ratio (X/Y)",
-                        "x": to_display(x_peano),
-                        "y": to_display(y_peano),
-                        "result": to_display_fraction(sfrac),
-                    }
-                elif op == "simplify_fraction_input":
-                    sfrac = simplify_fraction(x_frac)
-                    result = {
-                        "operation": "simplify",
-                        "x_frac": to_display_fraction(x_frac),
-                        "result": to_display_fraction(sfrac),
-                    }
-                elif op == "add_fractions":
-                    res = add_fractions(x_frac, y_frac)
-                    result = {
-                        "operation": "add",
-                        "x_frac": to_display_fraction(x_frac),
-                        "y_frac": to_display_fraction(y_frac),
-                        "result": to_display_fraction(res),
-                    }
-                elif op == "subtract_fractions":
-                    res = subtract_fractions(x_frac, y_frac)
-                    result = {
-                        "operation": "subtract",
-                        "x_frac": to_display_fraction(x_frac),
-                        "y_frac": to_display_fraction(y_frac),
-                        "result": to_display_fraction(res),
-                    }
-                elif op == "multiply_fractions":
-                    res = multiply_fractions(x_frac, y_frac)
-                    result = {
-                        "operation": "multiply",
-                        "x_frac": to_display_fraction(x_frac),
-                        "y_frac": to_display_fraction(y_frac),
-                        "result": to_display_fraction(res),
-                    }
-                elif op == "divide_fractions":
-                    res = divide_fractions(x_frac, y_frac)
-                    result = {
-                        "operation": "divide",
-                        "x_frac": to_display_fraction(x_frac),
-                        "y_frac": to_display_fraction(y_frac),
-                        "result": to_display_fraction(res),
-                    }
-                else:
-                    error = "Unsupported operation"
-
-            # Build filtered trace (limit depth to 10)
-            full_trace = get_trace_enriched()
-            max_depth_val = 10
-
-            # Filter trace by depth and hide clutter
-            filtered_trace = []
-            for n in full_trace:
-                if n.get("depth", 0) > max_depth_val:
-                    continue
-                
-                # Hide operations that clutter the formal derivation
-                op = n.get("op", "")
-                if op in ("predecessor", "successor"):
-                    # These are implementation details, not part of the formal derivation
-                    continue
-                    
-                filtered_trace.append(n)
+            # Fractions (only read by the fraction operations)
+            x_frac_vals = y_frac_vals = (0, 1)
+            if op in FRACTION_OPS:
+                x_frac_vals = (max(0, int(x_num_raw)), max(1, int(x_den_raw)))
+                y_frac_vals = (max(0, int(y_num_raw)), max(1, int(y_den_raw)))
+
+            # The trace and evaluation modes live on the shared AXIOMS; keep
+            # concurrent requests from interleaving their calls
+            with AXIOMS_LOCK:
+                if request.method == "POST":
+                    start_trace()
+                    entry = OPS.get(op)
+                    if entry is None:
+                        error = "Unsupported operation"
+                    else:
+                        fn, arg_names, label, render = entry
+                        operand_vals = {
+                            "x": (x_val,), "y": (y_val,), "x_frac": x_frac_vals, "y_frac": y_frac_vals,
+                        }
+                        values = [v for name in arg_names for v in operand_vals[name]]
+                        # Checked before any numeral string is built
+                        if _largest_term(op, values) > MAX_TERM_DEPTH:
+                            raise ValueError(
+                                f"Inputs too large: operands and results are limited to {MAX_TERM_DEPTH}"
+                            )
+                        largest = sorted(values)[-2:]
+                        fast_math = op in FAST_MATH_OPS and (
+                            largest[-1] > FAST_MATH_MAX_OPERAND
+                            or (len(largest) == 2 and largest[0] * largest[1] > FAST_MATH_MAX_PRODUCT)
+                            # Fraction add/subtract combine cross products with add, which
+                            # recurses once per unit of its second operand
+                            or (op in SUMMED_FRACTION_OPS and _largest_term(op, values) > FAST_MATH_MAX_OPERAND)
+                        )
+                        args = [
+                            make_fraction(*map(int_to_peano_str, operand_vals[name]))
+                            if name.endswith("_frac") else int_to_peano_str(operand_vals[name][0])
+                            for name in arg_names
+                        ]
+                        # Operands were built by int_to_peano_str, so skip re-validating them
+                        with trusted_input(), fast_math_mode(fast_math):
+                            res = fn(*args)
+                        result = {"operation": label}
+                        for name, arg in zip(arg_names, args):
+                            result[name] = to_display_fraction(arg) if name.endswith("_frac") else to_display(arg)
+                        result["result"] = render(res)
+
+                filtered_trace = get_trace_enriched(max_depth=TRACE_MAX_DEPTH, skip_ops=TRACE_HIDDEN_OPS)
+                steps = get_step_count()
+                negative = get_negative_flag()
 
             return render_template(
                 "index.html",
@@ -269,9 +219,10 @@ def create_app() -> Flask:
                 y_den=y_den_raw,
                 result=result,
                 error=error,
-                steps=get_step_count(),
+                steps=steps,
                 trace=filtered_trace,
-                negative=get_negative_flag(),
+                negative=negative,
+                fast_math=fast_math,
             )
         except Exception as exc:  # minimal logs per user preference
             error = str(exc)
@@ -1,28 +1,29 @@
 from __future__ import annotations
+import threading
+from contextlib import contextmanager
 from dataclasses import dataclass
-from peano_app.peano_core import PeanoAxioms
+from typing import Callable, Sequence
+from peano_app.peano_core import FlatNode, PeanoAxioms, _to_int, _to_str
+
+
+_strip_spaces = PeanoAxioms.normalize
 
 
 def int_to_peano_str(n: int) -> str:
     if n < 0:
         raise ValueError("Peano naturals are non-negative")
-    if n == 0:
-        return "0"
-    return f"s({int_to_peano_str(n - 1)})"
+    return _to_str(n)
 
 
 def peano_str_to_int(peano: str) -> int:
     # Robust to whitespace
-    s = peano.replace(" ", "")
-    if s == "0":
-        return 0
-    # Count occurrences of 's(' assuming canonical nesting
-    if not s.startswith("s(") or not s.endswith(")"):
-        raise ValueError(f"Invalid Peano representation: {peano}")
-    return s.count("s(")
+    return _to_int(_strip_spaces(peano))
 
 
 AXIOMS = PeanoAxioms()
+# AXIOMS holds the trace, the step count and the evaluation modes. Callers on
+# several threads hold this lock across each traced computation
+AXIOMS_LOCK = threading.RLock()
 
 
 def is_zero(peano: str) -> bool:
@@ -78,28 +79,39 @@ def mod_peano(x: str, y: str) -> str:
     return AXIOMS.mod_peano(x, y)
 
 
+def divmod_peano(x: str, y: str) -> tuple[str, str]:
+    return AXIOMS.divmod_peano(x, y)
+
+
 def gcd_peano(x: str, y: str) -> str:
     return AXIOMS.gcd_peano(x, y)
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class PeanoFraction:
     numerator: str
     denominator: str
 
 
 def make_fraction(numerator: str, denominator: str) -> PeanoFraction:
-    if denominator.replace(" ", "") == "0":
+    den = _strip_spaces(denominator)
+    if den == "0":
         raise ValueError("denominator cannot be 0")
-    return PeanoFraction(numerator.replace(" ", ""), denominator.replace(" ", ""))
+    return PeanoFraction(_strip_spaces(numerator), den)
 
 
 def peano_to_fraction(x: str) -> PeanoFraction:
-    return PeanoFraction(x.replace(" ", ""), successor("0"))
+    return PeanoFraction(_strip_spaces(x), successor("0"))
 
 
 def simplify_fraction(frac: PeanoFraction) -> PeanoFraction:
     g = gcd_peano(frac.numerator, frac.denominator)
+    if g == "s(0)":  # already in lowest terms
+        return frac
+    if g == frac.denominator:
+        return PeanoFraction(div_peano(frac.numerator, g), "s(0)")
+    if g == frac.numerator:
+        return PeanoFraction("s(0)", div_peano(frac.denominator, g))
     return PeanoFraction(div_peano(frac.numerator, g), div_peano(frac.denominator, g))
 
 
@@ -111,15 +123,23 @@ def to_display_fraction(frac: PeanoFraction) -> dict:
 
 
 # Fraction arithmetic (pure Peano naturals; subtraction clamps at 0)
+def _common_denominator(a: PeanoFraction, b: PeanoFraction) -> tuple[str, str, str]:
+    # Scale by lcm(a.den, b.den) rather than a.den*b.den to keep operands small
+    g = gcd_peano(a.denominator, b.denominator)
+    a_scale = div_peano(b.denominator, g)
+    b_scale = div_peano(a.denominator, g)
+    return a_scale, b_scale, multiply(a.denominator, a_scale)
+
+
 def add_fractions(a: PeanoFraction, b: PeanoFraction) -> PeanoFraction:
-    num = add(multiply(a.numerator, b.denominator), multiply(b.numerator, a.denominator))
-    den = multiply(a.denominator, b.denominator)
+    a_scale, b_scale, den = _common_denominator(a, b)
+    num = add(multiply(a.numerator, a_scale), multiply(b.numerator, b_scale))
     return simplify_fraction(PeanoFraction(num, den))
 
 
 def subtract_fractions(a: PeanoFraction, b: PeanoFraction) -> PeanoFraction:
-    num = subtract(multiply(a.numerator, b.denominator), multiply(b.numerator, a.denominator))
-    den = multiply(a.denominator, b.denominator)
+    a_scale, b_scale, den = _common_denominator(a, b)
+    num = subtract(multiply(a.numerator, a_scale), multiply(b.numerator, b_scale))
     return simplify_fraction(PeanoFraction(num, den))
 
 
@@ -143,16 +163,15 @@ def describe_fraction(numerator: str, denominator: str) -> dict:
     Includes gcd, simplified fraction, and the division relation
     n = d*q + r with both int and Peano renderings.
     """
-    num = numerator.replace(" ", "")
-    den = denominator.replace(" ", "")
+    num = _strip_spaces(numerator)
+    den = _strip_spaces(denominator)
     if den == "0":
         raise ValueError("denominator cannot be 0")
 
     g = gcd_peano(num, den)
     simp = PeanoFraction(div_peano(num, g), div_peano(den, g))
 
-    q = div_peano(num, den)
-    r = mod_peano(num, den)
+    q, r = divmod_peano(num, den)
     product = multiply(den, q)
     rhs = add(product, r)
 
@@ -184,12 +203,36 @@ def get_step_count() -> int:
     return AXIOMS.steps
 
 
-def start_trace() -> None:
-    AXIOMS.start_trace()
+@contextmanager
+def fast_math_mode(enabled: bool = True):
+    """Evaluate with fast_math set, holding AXIOMS_LOCK so no other thread sees it."""
+    with AXIOMS_LOCK:
+        previous = AXIOMS.fast_math
+        AXIOMS.fast_math = enabled
+        try:
+            yield
+        finally:
+            AXIOMS.fast_math = previous
+
+
+@contextmanager
+def trusted_input():
+    """Skip operand validation, for terms built by int_to_peano_str, holding AXIOMS_LOCK."""
+    with AXIOMS_LOCK:
+        previous = AXIOMS.trust_input
+        AXIOMS.trust_input = True
+        try:
+            yield
+        finally:
+            AXIOMS.trust_input = previous
+
 
+def start_trace(keep_memo: bool = True, tracing: bool = True) -> None:
+    AXIOMS.start_trace(keep_memo, tracing)
 
-def get_trace_flat() -> list[dict]:
-    return AXIOMS.get_trace_flat()
+
+def get_trace_flat(max_depth: int | None = None) -> list[FlatNode]:
+    return AXIOMS.get_trace_flat(max_depth)
 
 
 def get_negative_flag() -> bool:
@@ -202,135 +245,195 @@ def _is_peano_term(val: object) -> bool:
 
 
 def _to_int_if_peano(val: object) -> object:
+    if isinstance(val, tuple):  # divmod results
+        return tuple(_to_int_if_peano(v) for v in val)
     if _is_peano_term(val):
         return peano_str_to_int(val)  # may raise if malformed
     return val
 
 
-def _to_int_maybe(val: object) -> object:
-    try:
-        return _to_int_if_peano(val)
-    except Exception:
-        return None
+_MALFORMED = object()
 
 
-def _fmt_int_expr(op: str, args: list[object], result: object) -> str:
-    # Attempt to convert args/results to ints and build a compact meaning
+def _to_int_cached(val: object, cache: dict) -> object:
+    # Same numerals recur throughout a trace; convert each distinct term once
+    try:
+        return cache[val]
+    except KeyError:
+        pass
     try:
-        iargs = [_to_int_if_peano(a) for a in args]
-        ires = _to_int_if_peano(result)
+        conv = _to_int_if_peano(val)
     except Exception:
+        conv = _MALFORMED
+    cache[val] = conv
+    return conv
+
+
+_CMP_SYMBOLS = {"less_than": "<", "equal": "=", "greater_than": ">"}
+
+
+def _int_unary(template: str) -> Callable[[Sequence[object], object], str]:
+    def fmt(iargs: Sequence[object], ires: object) -> str:
+        if len(iargs) == 1 and isinstance(ires, int):
+            return template.format(iargs[0], ires)
         return ""
+    return fmt
 
-    def as_str(x: object) -> str:
-        return str(x)
 
-    if op == "successor" and len(iargs) == 1 and isinstance(ires, int):
-        return f"{as_str(iargs[0])} + 1 = {ires}"
-    if op == "predecessor" and len(iargs) == 1 and isinstance(ires, (int, str)):
-        try:
-            n = int(iargs[0])
-            m = int(ires) if isinstance(ires, int) else None
-        except Exception:
-            n, m = None, None
-        if n is not None and m is not None:
-            suffix = " (clamped)" if n == 0 and m == 0 else ""
-            return f"{n} - 1 = {m}{suffix}"
+def _int_binary(template: str, result_type: type) -> Callable[[Sequence[object], object], str]:
+    def fmt(iargs: Sequence[object], ires: object) -> str:
+        if len(iargs) == 2 and isinstance(ires, result_type):
+            return template.format(iargs[0], iargs[1], ires)
         return ""
-    if op == "add" and len(iargs) == 2 and isinstance(ires, int):
-        return f"{as_str(iargs[0])} + {as_str(iargs[1])} = {ires}"
-    if op == "subtract" and len(iargs) == 2 and isinstance(ires, (int, str)):
-        try:
-            a = int(iargs[0])
-            b = int(iargs[1])
-            c = int(ires) if isinstance(ires, int) else None
-        except Exception:
-            a = b = c = None
-        if a is not None and b is not None and c is not None:
-            suffix = " (clamped)" if a < b and c == 0 else ""
-            return f"{a} - {b} = {c}{suffix}"
+    return fmt
+
+
+def _int_predecessor(iargs: Sequence[object], ires: object) -> str:
+    if len(iargs) != 1 or not isinstance(ires, int):
         return ""
-    if op == "multiply" and len(iargs) == 2 and isinstance(ires, int):
-        return f"{as_str(iargs[0])} × {as_str(iargs[1])} = {ires}"
-    if op in ("less_than", "equal", "greater_than") and len(iargs) == 2 and isinstance(ires, bool):
-        symbol = {"less_than": "<", "equal": "=", "greater_than": ">"}[op]
-        return f"{as_str(iargs[0])} {symbol} {as_str(iargs[1])} = {ires}"
-    if op == "div" and len(iargs) == 2 and isinstance(ires, int):
-        return f"{as_str(iargs[0])} ÷ {as_str(iargs[1])} = {ires}"
-    if op == "mod" and len(iargs) == 2 and (_is_peano_term(result) or isinstance(ires, int)):
-        return f"{as_str(iargs[0])} mod {as_str(iargs[1])} = {as_str(ires)}"
-    if op == "gcd" and len(iargs) == 2 and (_is_peano_term(result) or isinstance(ires, int)):
-        return f"gcd({as_str(iargs[0])}, {as_str(iargs[1])}) = {as_str(ires)}"
-    if op in ("div_step", "mod_step") and len(iargs) >= 2:
-        return "step"
-    if op in ("is_zero", "peano"):
-        return "predicate"
-    return ""
+    try:
+        n = int(iargs[0])
+    except Exception:
+        return ""
+    suffix = " (clamped)" if n == 0 and ires == 0 else ""
+    return f"{n} - 1 = {ires}{suffix}"
 
 
-def _fmt_peano_expr(op: str, args: list[object], result: object) -> str:
+def _int_subtract(iargs: Sequence[object], ires: object) -> str:
+    if len(iargs) != 2 or not isinstance(ires, int):
+        return ""
     try:
-        pargs = [a for a in args]
-        pres = result
+        a = int(iargs[0])
+        b = int(iargs[1])
     except Exception:
         return ""
+    suffix = " (clamped)" if a < b and ires == 0 else ""
+    return f"{a} - {b} = {ires}{suffix}"
+
+
+def _int_divmod(iargs: Sequence[object], ires: object) -> str:
+    if len(iargs) != 2 or not isinstance(ires, tuple) or len(ires) != 2:
+        return ""
+    return f"{iargs[0]} = {iargs[1]} × {ires[0]} + {ires[1]}"
+
+
+def _step_fmt(args: Sequence[object], result: object) -> str:
+    return "step" if len(args) >= 2 else ""
+
+
+def _predicate_fmt(args: Sequence[object], result: object) -> str:
+    return "predicate"
+
+
+_INT_FMT: dict[str, Callable[[Sequence[object], object], str]] = {
+    "successor": _int_unary("{0} + 1 = {1}"),
+    "predecessor": _int_predecessor,
+    "add": _int_binary("{0} + {1} = {2}", int),
+    "subtract": _int_subtract,
+    "multiply": _int_binary("{0} × {1} = {2}", int),
+    **{op: _int_binary("{0} %s {1} = {2}" % symbol, bool) for op, symbol in _CMP_SYMBOLS.items()},
+    "div": _int_binary("{0} ÷ {1} = {2}", int),
+    "mod": _int_binary("{0} mod {1} = {2}", int),
+    "gcd": _int_binary("gcd({0}, {1}) = {2}", int),
+    "divmod": _int_divmod,
+    "div_step": _step_fmt,
+    "mod_step": _step_fmt,
+    "divmod_step": _step_fmt,
+    "is_zero": _predicate_fmt,
+    "peano": _predicate_fmt,
+}
 
-    def as_str(x: object) -> str:
-        return str(x)
-
-    if op == "successor" and len(pargs) == 1:
-        return f"successor: {as_str(pargs[0])} → {as_str(pres)}"
-    if op == "predecessor" and len(pargs) == 1:
-        return f"pred (derived): {as_str(pargs[0])} → {as_str(pres)}"
-    if op == "add" and len(pargs) == 2:
-        return f"add: {as_str(pargs[0])} + {as_str(pargs[1])} → {as_str(pres)}"
-    if op == "subtract" and len(pargs) == 2:
-        return f"sub (derived, clamped): {as_str(pargs[0])} − {as_str(pargs[1])} → {as_str(pres)}"
-    if op == "multiply" and len(pargs) == 2:
-        return f"mult: {as_str(pargs[0])} × {as_str(pargs[1])} → {as_str(pres)}"
-    if op in ("less_than", "equal", "greater_than") and len(pargs) == 2:
-        symbol = {"less_than": "<", "equal": "=", "greater_than": ">"}[op]
-        return f"compare: {as_str(pargs[0])} {symbol} {as_str(pargs[1])} → {as_str(result)}"
-    if op == "div" and len(pargs) == 2:
-        return f"divide: {as_str(pargs[0])} ÷ {as_str(pargs[1])} → {as_str(pres)}"
-    if op == "mod" and len(pargs) == 2:
-        return f"mod: {as_str(pargs[0])} mod {as_str(pargs[1])} → {as_str(pres)}"
-    if op == "gcd" and len(pargs) == 2:
-        return f"gcd: {as_str(pargs[0])}, {as_str(pargs[1])} → {as_str(pres)}"
-    if op in ("div_step", "mod_step") and len(pargs) >= 2:
-        return "step"
-    if op in ("is_zero", "peano"):
-        return "predicate"
-    return ""
 
+def _fmt_int_expr(op: str, iargs: Sequence[object], ires: object) -> str:
+    # Build a compact meaning from the int renderings of args/result
+    fmt = _INT_FMT.get(op)
+    return fmt(iargs, ires) if fmt else ""
 
-def get_trace_enriched() -> list[dict]:
-    raw = get_trace_flat()
+
+def _peano_unary(template: str) -> Callable[[Sequence[object], object], str]:
+    def fmt(args: Sequence[object], result: object) -> str:
+        return template.format(args[0], result) if len(args) == 1 else ""
+    return fmt
+
+
+def _peano_binary(template: str) -> Callable[[Sequence[object], object], str]:
+    def fmt(args: Sequence[object], result: object) -> str:
+        return template.format(args[0], args[1], result) if len(args) == 2 else ""
+    return fmt
+
+
+_PEANO_FMT: dict[str, Callable[[Sequence[object], object], str]] = {
+    "successor": _peano_unary("successor: {0} → {1}"),
+    "predecessor": _peano_unary("pred (derived): {0} → {1}"),
+    "add": _peano_binary("add: {0} + {1} → {2}"),
+    "subtract": _peano_binary("sub (derived, clamped): {0} − {1} → {2}"),
+    "multiply": _peano_binary("mult: {0} × {1} → {2}"),
+    **{op: _peano_binary("compare: {0} %s {1} → {2}" % symbol) for op, symbol in _CMP_SYMBOLS.items()},
+    "div": _peano_binary("divide: {0} ÷ {1} → {2}"),
+    "mod": _peano_binary("mod: {0} mod {1} → {2}"),
+    "gcd": _peano_binary("gcd: {0}, {1} → {2}"),
+    "divmod": _peano_binary("divmod: {0} ÷ {1} → {2}"),
+    "div_step": _step_fmt,
+    "mod_step": _step_fmt,
+    "divmod_step": _step_fmt,
+    "is_zero": _predicate_fmt,
+    "peano": _predicate_fmt,
+}
+
+
+def _fmt_peano_expr(op: str, args: Sequence[object], result: object) -> str:
+    fmt = _PEANO_FMT.get(op)
+    return fmt(args, result) if fmt else ""
+
+
+_enriched_cache: tuple[tuple, list[dict]] | None = None
+
+
+def get_trace_enriched(max_depth: int | None = None, skip_ops: frozenset[str] = frozenset()) -> list[dict]:
+    """Flattened trace with int/Peano meanings and explanations per node.
+
+    Nodes deeper than ``max_depth`` or whose op is in ``skip_ops`` are
+    dropped before any formatting work is done for them. The result is
+    reused until the trace changes.
+    """
+    global _enriched_cache
+    key = (AXIOMS.trace_version, max_depth, skip_ops)
+    if _enriched_cache is not None and _enriched_cache[0] == key:
+        return _enriched_cache[1]
+    raw = get_trace_flat(max_depth)
     enriched: list[dict] = []
+    cache: dict = {}
     for n in raw:
-        op = n.get("op")
-        args = n.get("args", [])
-        res = n.get("result")
-        meaning_int = _fmt_int_expr(op, args, res)
+        op = n.op
+        if op in skip_ops:
+            continue
+        args = n.args
+        res = n.result
+        iargs = [_to_int_cached(a, cache) for a in args]
+        ires = _to_int_cached(res, cache)
+        if ires is _MALFORMED or _MALFORMED in iargs:
+            meaning_int = ""
+            args_int = [None if a is _MALFORMED else a for a in iargs]
+            result_int = None if ires is _MALFORMED else ires
+        else:
+            meaning_int = _fmt_int_expr(op, iargs, ires)
+            args_int = iargs
+            result_int = ires
         meaning_peano = _fmt_peano_expr(op, args, res)
-        explanation = _explain_nl(op, args, res, n.get("axiom"))
-        axiom = n.get("axiom")
-        args_int = [_to_int_maybe(a) for a in args]
-        result_int = _to_int_maybe(res)
+        explanation = _explain_nl(op, args, res, n.axiom)
         enriched.append({
-            **n,
+            **n._asdict(),
             "meaning": meaning_int,
             "meaning_peano": meaning_peano,
             "explanation": explanation,
-            "axiom": axiom,
-            "definition": n.get("definition"),
             "args_int": args_int,
             "result_int": result_int,
         })
+    _enriched_cache = (key, enriched)
     return enriched
 
 
-def _explain_nl(op: str, args: list[object], result: object, axiom: object) -> str:
+def _explain_nl(op: str, args: Sequence[object], result: object, axiom: object) -> str:
     a = [str(x) for x in args]
     r = str(result)
     if op == "successor":
@@ -359,6 +462,10 @@ def _explain_nl(op: str, args: list[object], result: object, axiom: object) -> s
         return "Division step: if remainder < divisor stop; otherwise subtract divisor and increment quotient."
     if op == "mod_step":
         return "Modulo step: if remainder < divisor stop; otherwise subtract divisor and continue."
+    if op == "divmod":
+        return f"Divide {a[0]} by {a[1]} (repeated subtraction) → (quotient, remainder) {r}."
+    if op == "divmod_step":
+        return "Divmod step: if remainder < divisor stop; otherwise subtract divisor and increment quotient."
     if op in ("peano", "is_zero"):
         return "Predicate evaluation."
     return ""
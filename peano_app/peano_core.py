@@ -1,289 +1,591 @@
 from __future__ import annotations
 
+import operator
+from dataclasses import dataclass
+from typing import Callable, NamedTuple
+
+
+def _to_int(term: str) -> int:
+    """Depth (number of successors) of a normalized canonical term s(...s(0)...)."""
+    if term == "0":
+        return 0
+    # Canonical nesting of depth n has length 3n + 1, but only the exact
+    # s(...s(0)...) form of that length is a numeral
+    n, extra = divmod(len(term) - 1, 3)
+    if extra or term != _to_str(n):
+        raise ValueError(f"Invalid Peano representation: {term}")
+    return n
+
+
+# Canonical terms for small depths, built once; most results and operands fall here
+_SMALL = ["s(" * n + "0" + ")" * n for n in range(256)]
+
+
+def _to_str(n: int) -> str:
+    if 0 <= n < 256:
+        return _SMALL[n]
+    return "s(" * n + "0" + ")" * n
+
+
+def _render(value: object) -> object:
+    # Trace nodes hold int depths; bools and markers such as "error" pass through
+    if isinstance(value, bool) or not isinstance(value, (int, tuple)):
+        return value
+    if isinstance(value, tuple):
+        return tuple(_render(v) for v in value)
+    return _to_str(value)
+
+
+# Bound on memoized results (each entry keeps its trace subtree)
+MEMO_SIZE = 256
+# Bound on the steps, roughly trace nodes, pinned by all memoized subtrees;
+# a larger call keeps only its result and step count
+MEMO_MAX_STEPS = 100_000
+# Calls cheaper than this many steps are recomputed rather than memoized
+MEMO_MIN_STEPS = 16
+
+
+@dataclass(slots=True, eq=False)
+class TraceNode:
+    """One call in the derivation tree; args and result are int depths."""
+    op: str
+    args: tuple[object, ...]
+    children: list[TraceNode] | None = None  # allocated on the first child
+    result: object = None
+    axiom: str | None = None
+    definition: str | None = None
+
+
+class FlatNode(NamedTuple):
+    """A trace node as listed by get_trace_flat, with terms rendered as strings."""
+    depth: int
+    op: str
+    args: tuple[object, ...]
+    result: object
+    axiom: str | None
+    definition: str | None
+
+
+# Handed out by _enter while tracing is off: callers tag it as usual, but it
+# is never attached to a tree, so no node is allocated per call
+_UNTRACED = TraceNode("untraced", ())
+
 
 class PeanoAxioms:
     """Implements Peano Arithmetic (PA) with tracing and step counting.
-    
+
     Peano axioms:
       - A1: 0 is a natural number
-      - A2: If x is natural, s(x) is natural  
+      - A2: If x is natural, s(x) is natural
       - A3: s(x) ≠ 0 for all x
       - A4: s(x) = s(y) → x = y (injectivity)
       - A5: Induction schema (implicit in recursive definitions)
-      
+
     Primitive recursive definitions (derived from axioms):
       - add(x, 0) = x; add(x, s(y)) = s(add(x, y))
       - mult(x, 0) = 0; mult(x, s(y)) = mult(x, y) + x
-      
+
     Other derived operations:
-      - predecessor, subtraction (clamped), division, modulo, gcd
+      - predecessor, subtraction (clamped), division, modulo, divmod, gcd
+
+    The public methods take and return canonical term strings. Internally
+    a term is carried as its depth (s(s(0)) is 2), so each recursive step
+    is an int operation; trace nodes store depths too and are rendered
+    back to terms by get_trace_flat.
+
+    With ``fast_math`` enabled, add/multiply/subtract/equal/less_than/div/
+    mod/divmod/gcd evaluate on the integer depths of their operands and
+    record a single trace node instead of walking the recursive definition
+    (greater_than is built from equal and less_than). add and multiply keep
+    their ADD-/MULT- definitions and step counts in that mode.
+
+    add/multiply/div/mod/divmod/gcd results are memoized together with the
+    trace subtree, step count and negative flag they produced. A repeated
+    call replays those, so traces and step counts match a fresh evaluation.
+    Only calls costing more than MEMO_MIN_STEPS are kept, and the cached
+    subtrees together cost at most MEMO_MAX_STEPS.
+
+    Trace nodes are only built while ``tracing`` is on, which start_trace()
+    turns on by default. Steps and the negative flag are always counted.
+
+    With ``trust_input`` enabled, operands are taken to be canonical
+    numerals as produced by _to_str and are not checked or normalized;
+    call validate() once on anything else first.
     """
 
     def __init__(self) -> None:
         self.steps: int = 0
         self.negative_encountered: bool = False
-        self.trace_stack: list[dict] = []
-        self.trace_root: dict | None = None
+        self.trace_stack: list[TraceNode] = []
+        self.trace_root: TraceNode | None = None
+        self.trace_version: int = 0  # bumped whenever the trace tree changes
+        self.tracing: bool = False
+        self.fast_math: bool = False
+        self.trust_input: bool = False  # skip parsing checks for terms built by _to_str
+        self._memo: dict[tuple, tuple] = {}
+        self._memo_steps: int = 0  # steps of the subtrees held by _memo
 
     # ----- Basic term utilities -----
     @staticmethod
     def normalize(term: str) -> str:
-        return term.replace(" ", "")
+        # Terms built by _to_str never contain spaces; skip the copy
+        return term.replace(" ", "") if " " in term else term
+
+    def validate(self, term: str) -> str:
+        """Normalize ``term``, raising ValueError unless it is a canonical numeral."""
+        term = self.normalize(term)
+        _to_int(term)
+        return term
+
+    def _parse(self, term: str) -> int:
+        if self.trust_input:
+            return (len(term) - 1) // 3
+        return _to_int(self.normalize(term))
 
     def _step(self) -> None:
         self.steps += 1
 
+    def _fast(self, node: TraceNode, definition: str, kernel: Callable[..., int | tuple[int, ...]], *args: int):
+        # Evaluate directly on depths; used when fast_math is enabled
+        node.definition = definition
+        res = kernel(*args)
+        self._exit(node, res)
+        return res
+
+    def _memoized(self, op: str, compute: Callable[[int, int], object], x: int, y: int):
+        key = (op, self.fast_math, x, y)
+        hit = self._memo.pop(key, None)
+        # An entry stored while tracing was off has no subtree to replay
+        if hit is not None and (hit[1] is not None or not self.tracing):
+            self._memo[key] = hit  # most recently used goes last
+            res, node, steps, negative = hit
+            self.steps += steps
+            self.negative_encountered = self.negative_encountered or negative
+            if self.tracing:
+                self._attach(node)
+            return res
+        steps_before, negative_before = self.steps, self.negative_encountered
+        self.negative_encountered = False
+        try:
+            res = compute(x, y)
+        finally:
+            negative = self.negative_encountered
+            self.negative_encountered = negative_before or negative
+        steps = self.steps - steps_before
+        if steps <= MEMO_MIN_STEPS:
+            return res
+        if not self.tracing or steps > MEMO_MAX_STEPS:
+            node = None
+        elif self.trace_stack:
+            node = self.trace_stack[-1].children[-1]
+        else:
+            node = self.trace_root
+        cost = steps if node is not None else 0
+        while self._memo and (len(self._memo) >= MEMO_SIZE or self._memo_steps + cost > MEMO_MAX_STEPS):
+            _, old_node, old_steps, _ = self._memo.pop(next(iter(self._memo)))
+            if old_node is not None:
+                self._memo_steps -= old_steps
+        self._memo[key] = (res, node, steps, negative)
+        self._memo_steps += cost
+        return res
+
     # ----- Tracing helpers -----
-    def start_trace(self) -> None:
+    def start_trace(self, keep_memo: bool = True, tracing: bool = True) -> None:
+        """Reset counters; with ``tracing=False`` only steps are recorded."""
+        if not keep_memo:
+            self._memo.clear()
+            self._memo_steps = 0
+        self.tracing = tracing
         self.steps = 0
         self.negative_encountered = False
         self.trace_stack = []
         self.trace_root = None
+        self.trace_version += 1
 
-    def _enter(self, op: str, args: list[str]) -> dict:
-        node = {"op": op, "args": args[:], "children": [], "result": None, "axiom": None}
+    def _attach(self, node: TraceNode) -> None:
         if not self.trace_stack:
             self.trace_root = node
         else:
-            self.trace_stack[-1]["children"].append(node)
+            parent = self.trace_stack[-1]
+            if parent.children is None:
+                parent.children = [node]
+            else:
+                parent.children.append(node)
+        self.trace_version += 1
+
+    def _enter(self, op: str, args: tuple[object, ...]) -> TraceNode:
+        if not self.tracing:
+            return _UNTRACED
+        node = TraceNode(op, args)
+        self._attach(node)
         self.trace_stack.append(node)
         return node
 
-    def _exit(self, node: dict, result: str | bool) -> None:
-        node["result"] = result
+    def _exit(self, node: TraceNode, result: object) -> None:
+        node.result = result
         if self.trace_stack and self.trace_stack[-1] is node:
             self.trace_stack.pop()
 
-    def get_trace_flat(self) -> list[dict]:
-        out: list[dict] = []
-
-        def walk(n: dict, depth: int) -> None:
-            out.append({
-                "depth": depth,
-                "op": n["op"],
-                "args": n["args"],
-                "result": n["result"],
-                "axiom": n.get("axiom"),
-            })
-            for c in n.get("children", []):
-                walk(c, depth + 1)
-
-        if self.trace_root is not None:
-            walk(self.trace_root, 0)
+    def _close(self, pending: list[TraceNode], result: object) -> None:
+        # A tail-recursive definition run as a loop leaves one node open per
+        # level; every level returns the innermost result
+        for node in reversed(pending):
+            self._exit(node, result)
+
+    def get_trace_flat(self, max_depth: int | None = None) -> list[FlatNode]:
+        """Pre-order list of trace nodes with terms rendered as strings.
+
+        Subtrees below ``max_depth`` are skipped without being rendered.
+        """
+        out: list[FlatNode] = []
+        if self.trace_root is None:
+            return out
+        # Explicit stack instead of recursion: traces can nest deeper than
+        # the interpreter's recursion limit
+        stack: list[tuple[TraceNode, int]] = [(self.trace_root, 0)]
+        while stack:
+            n, depth = stack.pop()
+            out.append(FlatNode(
+                depth, n.op, tuple(_render(a) for a in n.args), _render(n.result), n.axiom, n.definition
+            ))
+            if max_depth is not None and depth >= max_depth:
+                continue
+            if n.children:
+                stack.extend((c, depth + 1) for c in reversed(n.children))
         return out
 
+    # ----- Public term API -----
     def is_zero(self, x: str) -> bool:
+        return self._is_zero(self._parse(x))
+
+    def successor(self, x: str) -> str:
+        return _to_str(self._successor(self._parse(x)))
+
+    def predecessor(self, x: str) -> str:
+        return _to_str(self._predecessor(self._parse(x)))
+
+    def peano(self, x: str) -> bool:
+        # Always checked: deciding membership is the point of this operation
+        try:
+            n = _to_int(self.normalize(x))
+        except ValueError:
+            # Not of the form 0 or s(...): neither A1 nor A2 applies
+            self._step()
+            node = self._enter("peano", (x,))
+            self._exit(node, False)
+            return False
+        return self._peano(n)
+
+    def equal(self, x: str, y: str) -> bool:
+        return self._equal(self._parse(x), self._parse(y))
+
+    def greater_than(self, x: str, y: str) -> bool:
+        return self._greater_than(self._parse(x), self._parse(y))
+
+    def add(self, x: str, y: str) -> str:
+        """Addition by primitive recursion: add(x,0)=x; add(x,s(y))=s(add(x,y))."""
+        return _to_str(self._memoized("add", self._add, self._parse(x), self._parse(y)))
+
+    def multiply(self, x: str, y: str) -> str:
+        """Multiplication by primitive recursion: mult(x,0)=0; mult(x,s(y))=mult(x,y)+x."""
+        return _to_str(self._memoized("multiply", self._multiply, self._parse(x), self._parse(y)))
+
+    def less_than(self, x: str, y: str) -> bool:
+        return self._less_than(self._parse(x), self._parse(y))
+
+    def subtract(self, x: str, y: str) -> str:
+        return _to_str(self._subtract(self._parse(x), self._parse(y)))
+
+    # Division and modulo via repeated subtraction (not primitive Peano, but definitional extension)
+    def div_peano(self, x: str, y: str) -> str:
+        return _to_str(self._div(self._parse(x), self._parse(y)))
+
+    def mod_peano(self, x: str, y: str) -> str:
+        return _to_str(self._mod(self._parse(x), self._parse(y)))
+
+    def divmod_peano(self, x: str, y: str) -> tuple[str, str]:
+        """Quotient and remainder from a single repeated-subtraction pass."""
+        q, r = self._divmod(self._parse(x), self._parse(y))
+        return _to_str(q), _to_str(r)
+
+    def gcd_peano(self, x: str, y: str) -> str:
+        return _to_str(self._gcd(self._parse(x), self._parse(y)))
+
+    # ----- Definitions on depths -----
+    def _is_zero(self, x: int) -> bool:
         self._step()
-        node = self._enter("is_zero", [x])
-        s = self.normalize(x)
-        if s == "0":
-            node["axiom"] = "A1"  # 0 is a natural number
+        node = self._enter("is_zero", (x,))
+        if x == 0:
+            node.axiom = "A1"  # 0 is a natural number
             self._exit(node, True)
             return True
         else:
             self._exit(node, False)
             return False
 
-    def successor(self, x: str) -> str:
+    def _successor(self, x: int) -> int:
         self._step()
-        node = self._enter("successor", [x])
-        res = f"s({self.normalize(x)})"
+        node = self._enter("successor", (x,))
+        res = x + 1
         self._exit(node, res)
         return res
 
-    def predecessor(self, x: str) -> str:
+    def _predecessor(self, x: int) -> int:
         self._step()
-        node = self._enter("predecessor", [x])
-        s = self.normalize(x)
-        if s == "0":
-            res = "0"
-            self._exit(node, res)
-            return res
-        if not s.startswith("s(") or not s.endswith(")"):
-            self._exit(node, "error")
-            raise ValueError(f"Invalid Peano representation: {x}")
-        res = s[2:-1]
+        node = self._enter("predecessor", (x,))
+        res = x - 1 if x else 0  # pred(0) = 0 (clamped)
         self._exit(node, res)
         return res
 
     # ----- Axioms A1, A2 -----
-    def peano(self, x: str) -> bool:
-        self._step()
-        node = self._enter("peano", [x])
-        s = self.normalize(x)
-        if s == "0":
-            node["axiom"] = "A1"
-            self._exit(node, True)
-            return True
-        if s.startswith("s(") and s.endswith(")"):
-            node["axiom"] = "A2"
-            res = self.peano(self.predecessor(s))
-            self._exit(node, res)
-            return res
-        self._exit(node, False)
-        return False
+    def _peano(self, x: int) -> bool:
+        pending = []
+        while True:
+            self._step()
+            node = self._enter("peano", (x,))
+            pending.append(node)
+            if x == 0:
+                node.axiom = "A1"
+                res = True
+                break
+            node.axiom = "A2"
+            x = self._predecessor(x)
+        self._close(pending, res)
+        return res
 
     # ----- Equality using A3, A4 -----
-    def equal(self, x: str, y: str) -> bool:
-        self._step()
-        node = self._enter("equal", [x, y])
-        xs, ys = self.normalize(x), self.normalize(y)
-        if xs == "0" and ys == "0":
-            self._exit(node, True)
-            return True
-        if xs == "0" or ys == "0":  # A3
-            node["axiom"] = "A3"
-            self._exit(node, False)
-            return False
-        node["axiom"] = "A4"
-        res = self.equal(self.predecessor(xs), self.predecessor(ys))
-        self._exit(node, res)
+    def _equal(self, x: int, y: int) -> bool:
+        if self.fast_math:
+            # A4 peels equal depths pairwise, so the walk ends in A3 exactly when they differ
+            self._step()
+            node = self._enter("equal", (x, y))
+            return self._fast(node, "EQ-FAST", operator.eq, x, y)
+        pending = []
+        while True:
+            self._step()
+            node = self._enter("equal", (x, y))
+            pending.append(node)
+            if x == 0 and y == 0:
+                res = True
+                break
+            if x == 0 or y == 0:  # A3
+                node.axiom = "A3"
+                res = False
+                break
+            node.axiom = "A4"
+            x, y = self._predecessor(x), self._predecessor(y)
+        self._close(pending, res)
         return res
 
-    def greater_than(self, x: str, y: str) -> bool:
+    def _greater_than(self, x: int, y: int) -> bool:
         self._step()
-        node = self._enter("greater_than", [x, y])
-        res = (not self.equal(x, y)) and (not self.less_than(x, y))
+        node = self._enter("greater_than", (x, y))
+        res = (not self._equal(x, y)) and (not self._less_than(x, y))
         self._exit(node, res)
         return res
 
     # ----- Definitional extensions -----
-    def add(self, x: str, y: str) -> str:
-        """Addition by primitive recursion: add(x,0)=x; add(x,s(y))=s(add(x,y))."""
+    def _add(self, x: int, y: int) -> int:
         self._step()
-        node = self._enter("add", [x, y])
-        ys = self.normalize(y)
-        if ys == "0":
-            node["definition"] = "ADD-BASE"  # add(x,0) = x
-            res = self.normalize(x)
-            self._exit(node, res)
-            return res
-        if not ys.startswith("s("):
-            self._exit(node, "error")
-            raise ValueError(f"Invalid Peano representation: {y}")
-        node["definition"] = "ADD-REC"  # add(x,s(y)) = s(add(x,y))
+        node = self._enter("add", (x, y))
+        if self.fast_math:
+            # Closed form, still charged the 2y steps of the recursion below
+            self.steps += 2 * y
+            return self._fast(node, "ADD-REC" if y else "ADD-BASE", operator.add, x, y)
+        if y == 0:
+            node.definition = "ADD-BASE"  # add(x,0) = x
+            self._exit(node, x)
+            return x
+        node.definition = "ADD-REC"  # add(x,s(y)) = s(add(x,y))
         # The result is s(add(x, pred(y))) but we don't compute it separately
         # We show the equation directly as the definition requires
-        inner_y = self.predecessor(ys)
-        inner_result = self.add(x, inner_y)
-        res = f"s({inner_result})"
+        inner_y = self._predecessor(y)
+        inner_result = self._add(x, inner_y)
+        res = inner_result + 1
         self._exit(node, res)
         return res
 
-    def multiply(self, x: str, y: str) -> str:
-        """Multiplication by primitive recursion: mult(x,0)=0; mult(x,s(y))=mult(x,y)+x."""
+    def _multiply(self, x: int, y: int) -> int:
         self._step()
-        node = self._enter("multiply", [x, y])
-        ys = self.normalize(y)
-        if ys == "0":
-            node["definition"] = "MULT-BASE"  # mult(x,0) = 0
-            res = "0"
-            self._exit(node, res)
-            return res
-        if not ys.startswith("s("):
-            self._exit(node, "error")
-            raise ValueError(f"Invalid Peano representation: {y}")
-        node["definition"] = "MULT-REC"  # mult(x,s(y)) = mult(x,y) + x
+        node = self._enter("multiply", (x, y))
+        if self.fast_math:
+            # Closed form, still charged the y * (2x + 3) steps of the recursion
+            self.steps += y * (2 * x + 3)
+            return self._fast(node, "MULT-REC" if y else "MULT-BASE", operator.mul, x, y)
+        if y == 0:
+            node.definition = "MULT-BASE"  # mult(x,0) = 0
+            self._exit(node, 0)
+            return 0
+        node.definition = "MULT-REC"  # mult(x,s(y)) = mult(x,y) + x
         # Show the recursive step explicitly
-        inner_y = self.predecessor(ys)
-        mult_result = self.multiply(x, inner_y)
-        res = self.add(mult_result, x)
+        inner_y = self._predecessor(y)
+        mult_result = self._multiply(x, inner_y)
+        res = self._add(mult_result, x)
         self._exit(node, res)
         return res
 
-    def less_than(self, x: str, y: str) -> bool:
-        self._step()
-        node = self._enter("less_than", [x, y])
-        xs, ys = self.normalize(x), self.normalize(y)
-        if xs == "0" and ys == "0":
-            node["definition"] = "LT-BASE"  # lt(0,0) = false
-            self._exit(node, False)
-            return False
-        if xs == "0" and ys != "0":
-            node["definition"] = "LT-BASE"  # lt(0,s(x)) = true
-            self._exit(node, True)
-            return True
-        if xs != "0" and ys == "0":
-            node["definition"] = "LT-BASE"  # lt(s(x),0) = false
-            self._exit(node, False)
-            return False
-        node["definition"] = "LT-REC"  # lt(s(x),s(y)) = lt(x,y)
-        res = self.less_than(self.predecessor(xs), self.predecessor(ys))
-        self._exit(node, res)
+    def _less_than(self, x: int, y: int) -> bool:
+        if self.fast_math:
+            # LT-REC peels both sides until a base case, which compares the depths
+            self._step()
+            node = self._enter("less_than", (x, y))
+            return self._fast(node, "LT-FAST", operator.lt, x, y)
+        pending = []
+        while True:
+            self._step()
+            node = self._enter("less_than", (x, y))
+            pending.append(node)
+            if x == 0 and y == 0:
+                node.definition = "LT-BASE"  # lt(0,0) = false
+                res = False
+                break
+            if x == 0 and y != 0:
+                node.definition = "LT-BASE"  # lt(0,s(x)) = true
+                res = True
+                break
+            if x != 0 and y == 0:
+                node.definition = "LT-BASE"  # lt(s(x),0) = false
+                res = False
+                break
+            node.definition = "LT-REC"  # lt(s(x),s(y)) = lt(x,y)
+            x, y = self._predecessor(x), self._predecessor(y)
+        self._close(pending, res)
         return res
 
-    def subtract(self, x: str, y: str) -> str:
-        self._step()
-        node = self._enter("subtract", [x, y])
-        xs, ys = self.normalize(x), self.normalize(y)
-        if ys == "0":
-            node["definition"] = "SUB-BASE"  # sub(x,0) = x
-            self._exit(node, xs)
-            return xs
-        if xs == "0":
-            node["definition"] = "SUB-BASE"  # sub(0,s(y)) = 0 (clamped)
-            self.negative_encountered = True
-            self._exit(node, "0")
-            return "0"
-        node["definition"] = "SUB-REC"  # sub(s(x),s(y)) = sub(x,y)
-        res = self.subtract(self.predecessor(xs), self.predecessor(ys))
-        self._exit(node, res)
+    def _subtract(self, x: int, y: int) -> int:
+        if self.fast_math:
+            self._step()
+            node = self._enter("subtract", (x, y))
+            if y > x:
+                self.negative_encountered = True
+            return self._fast(node, "SUB-FAST", lambda a, b: max(0, a - b), x, y)
+        pending = []
+        while True:
+            self._step()
+            node = self._enter("subtract", (x, y))
+            pending.append(node)
+            if y == 0:
+                node.definition = "SUB-BASE"  # sub(x,0) = x
+                res = x
+                break
+            if x == 0:
+                node.definition = "SUB-BASE"  # sub(0,s(y)) = 0 (clamped)
+                self.negative_encountered = True
+                res = 0
+                break
+            node.definition = "SUB-REC"  # sub(s(x),s(y)) = sub(x,y)
+            x, y = self._predecessor(x), self._predecessor(y)
+        self._close(pending, res)
         return res
 
-    # Division and modulo via repeated subtraction (not primitive Peano, but definitional extension)
-    def div_peano(self, x: str, y: str) -> str:
+    def _div(self, x: int, y: int) -> int:
+        return self._memoized("div", self._compute_div, x, y)
+
+    def _mod(self, x: int, y: int) -> int:
+        return self._memoized("mod", self._compute_mod, x, y)
+
+    def _divmod(self, x: int, y: int) -> tuple[int, int]:
+        return self._memoized("divmod", self._compute_divmod, x, y)
+
+    def _gcd(self, x: int, y: int) -> int:
+        return self._memoized("gcd", self._compute_gcd, x, y)
+
+    def _compute_div(self, x: int, y: int) -> int:
         self._step()
-        node = self._enter("div", [x, y])
-        node["definition"] = "DIV-DEF"  # div(x,y) = repeated subtraction
-        ys = self.normalize(y)
-        if ys == "0":
+        node = self._enter("div", (x, y))
+        node.definition = "DIV-DEF"  # div(x,y) = repeated subtraction
+        if y == 0:
             self._exit(node, "error")
             raise ValueError("division by zero")
+        if self.fast_math:
+            return self._fast(node, "DIV-FAST", operator.floordiv, x, y)
 
-        def helper(rem: str, den: str, acc: str) -> str:
+        # Repeated subtraction: one div_step per quotient increment
+        pending = [node]
+        rem, acc = x, 0
+        while True:
             self._step()
-            hnode = self._enter("div_step", [rem, den, acc])
-            hnode["definition"] = "DIV-STEP"
-            res = acc if self.less_than(rem, den) else helper(self.subtract(rem, den), den, self.successor(acc))
-            self._exit(hnode, res)
-            return res
+            hnode = self._enter("div_step", (rem, y, acc))
+            hnode.definition = "DIV-STEP"
+            pending.append(hnode)
+            if self._less_than(rem, y):
+                res = acc
+                break
+            rem, acc = self._subtract(rem, y), self._successor(acc)
+        self._close(pending, res)
+        return res
 
-        res = helper(self.normalize(x), ys, "0")
-        self._exit(node, res)
+    def _compute_divmod(self, x: int, y: int) -> tuple[int, int]:
+        self._step()
+        node = self._enter("divmod", (x, y))
+        node.definition = "DIVMOD-DEF"  # divmod(x,y) = (div(x,y), mod(x,y))
+        if y == 0:
+            self._exit(node, "error")
+            raise ValueError("division by zero")
+        if self.fast_math:
+            return self._fast(node, "DIVMOD-FAST", divmod, x, y)
+
+        pending = [node]
+        rem, acc = x, 0
+        while True:
+            self._step()
+            hnode = self._enter("divmod_step", (rem, y, acc))
+            hnode.definition = "DIVMOD-STEP"
+            pending.append(hnode)
+            if self._less_than(rem, y):
+                res = (acc, rem)
+                break
+            rem, acc = self._subtract(rem, y), self._successor(acc)
+        self._close(pending, res)
         return res
 
-    def mod_peano(self, x: str, y: str) -> str:
+    def _compute_mod(self, x: int, y: int) -> int:
         self._step()
-        node = self._enter("mod", [x, y])
-        node["definition"] = "MOD-DEF"  # mod(x,y) = remainder after repeated subtraction
-        ys = self.normalize(y)
-        if ys == "0":
+        node = self._enter("mod", (x, y))
+        node.definition = "MOD-DEF"  # mod(x,y) = remainder after repeated subtraction
+        if y == 0:
             self._exit(node, "error")
             raise ValueError("modulo by zero")
+        if self.fast_math:
+            return self._fast(node, "MOD-FAST", operator.mod, x, y)
 
-        def helper(rem: str, den: str) -> str:
+        pending = [node]
+        rem = x
+        while True:
             self._step()
-            hnode = self._enter("mod_step", [rem, den])
-            hnode["definition"] = "MOD-STEP"
-            res = rem if self.less_than(rem, den) else helper(self.subtract(rem, den), den)
-            self._exit(hnode, res)
-            return res
-
-        res = helper(self.normalize(x), ys)
-        self._exit(node, res)
+            hnode = self._enter("mod_step", (rem, y))
+            hnode.definition = "MOD-STEP"
+            pending.append(hnode)
+            if self._less_than(rem, y):
+                res = rem
+                break
+            rem = self._subtract(rem, y)
+        self._close(pending, res)
         return res
 
-    def gcd_peano(self, x: str, y: str) -> str:
+    def _compute_gcd(self, x: int, y: int) -> int:
         self._step()
-        node = self._enter("gcd", [x, y])
-        ys = self.normalize(y)
-        if ys == "0":
-            node["definition"] = "GCD-BASE"  # gcd(x,0) = x
-            res = self.normalize(x)
-            self._exit(node, res)
-            return res
-        node["definition"] = "GCD-REC"  # gcd(x,y) = gcd(y, mod(x,y))
-        res = self.gcd_peano(ys, self.mod_peano(x, ys))
-        self._exit(node, res)
+        node = self._enter("gcd", (x, y))
+        if self.fast_math:
+            # Euclid on the depths in one node, one step per gcd(y, x mod y) level
+            node.definition = "GCD-FAST"
+            while y:
+                self._step()
+                x, y = y, x % y
+            self._exit(node, x)
+            return x
+        # Euclid's recursion is a tail call: loop instead, keeping each level's
+        # node open so the trace nests exactly as the recursive form would
+        pending = [node]
+        while True:
+            if y == 0:
+                node.definition = "GCD-BASE"  # gcd(x,0) = x
+                res = x
+                break
+            node.definition = "GCD-REC"  # gcd(x,y) = gcd(y, mod(x,y))
+            x, y = y, self._mod(x, y)
+            self._step()
+            node = self._enter("gcd", (x, y))
+            pending.append(node)
+        self._close(pending, res)
         return res
-
@@ -6,17 +6,21 @@ Tests all operations with various inputs, avoiding negative results.
 
 import sys
 import os
+import threading
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from peano_app.peano import (
     int_to_peano_str, peano_str_to_int,
     successor, predecessor, add, multiply, subtract,
     less_than, equal, greater_than,
-    div_peano, mod_peano, gcd_peano,
+    div_peano, mod_peano, divmod_peano, gcd_peano,
     make_fraction, add_fractions, subtract_fractions, 
     multiply_fractions, divide_fractions, simplify_fraction,
-    start_trace, get_step_count, get_negative_flag
+    start_trace, get_step_count, get_negative_flag, fast_math_mode,
+    trusted_input, get_trace_flat, AXIOMS, AXIOMS_LOCK
 )
+from peano_app.peano_core import MEMO_MAX_STEPS
+from peano_app.app import app
 
 def test_conversion():
     """Test int <-> Peano string conversion"""
@@ -28,7 +32,24 @@ def test_conversion():
         peano = int_to_peano_str(n)
         back = peano_str_to_int(peano)
         print(f"{n} -> {peano} -> {back} {'✓' if back == n else '✗'}")
-    
+
+    # Numerals deeper than the recursion limit must still convert
+    n = sys.getrecursionlimit() * 2
+    peano = int_to_peano_str(n)
+    back = peano_str_to_int(peano)
+    canonical = peano == "s(" * n + "0" + ")" * n
+    print(f"{n} -> s(...0) -> {back} {'✓' if back == n and canonical else '✗'}")
+
+    # Non-numerals are rejected even when their length matches a numeral
+    for term in ["s(abcd)", "s(0)+s(0))", "s(0"]:
+        try:
+            peano_str_to_int(term)
+            rejected = False
+        except ValueError:
+            rejected = True
+        member = AXIOMS.peano(term)
+        print(f"{term!r} rejected: {rejected}, peano: {member} {'✓' if rejected and not member else '✗'}")
+
     print()
 
 def test_successor_predecessor():
@@ -186,6 +207,10 @@ def test_division_modulo():
         remainder = mod_int
         check = b * quotient + remainder
         print(f"  Check: {b}×{quotient}+{remainder} = {check} {'✓' if check == a else '✗'}")
+
+        # divmod must agree with div and mod
+        q, r = divmod_peano(peano_a, peano_b)
+        print(f"  divmod({a}, {b}) = ({peano_str_to_int(q)}, {peano_str_to_int(r)}) {'✓' if (q, r) == (div_result, mod_result) else '✗'}")
         print()
 
 def test_gcd():
@@ -368,6 +393,177 @@ def test_step_counting():
     
     print()
 
+def test_memo_replay():
+    """Test that repeated memoized calls replay the same trace and steps"""
+    print("=== MEMO REPLAY TESTS ===")
+
+    operations = [
+        ("7 + 9", lambda: add(int_to_peano_str(7), int_to_peano_str(9))),
+        ("4 × 5", lambda: multiply(int_to_peano_str(4), int_to_peano_str(5))),
+        ("10 ÷ 3", lambda: div_peano(int_to_peano_str(10), int_to_peano_str(3))),
+        ("10 mod 3", lambda: mod_peano(int_to_peano_str(10), int_to_peano_str(3))),
+        ("gcd(12, 8)", lambda: gcd_peano(int_to_peano_str(12), int_to_peano_str(8)))
+    ]
+
+    for desc, op in operations:
+        # An untraced run first: the traced runs must not replay its empty trace
+        start_trace(keep_memo=False, tracing=False)
+        untraced = (op(), get_step_count(), get_negative_flag(), get_trace_flat())
+        runs = []
+        for _ in range(2):
+            start_trace()
+            result = op()
+            runs.append((result, get_step_count(), get_negative_flag(), get_trace_flat()))
+        print(f"{desc} replayed {'✓' if runs[0] == runs[1] and runs[0][3] else '✗'}")
+        same_count = untraced[:3] == runs[0][:3] and untraced[3] == []
+        print(f"{desc} untraced steps: {untraced[1]} {'✓' if same_count else '✗'}")
+
+    # Subtrees too large for the memo budget are not pinned, but still replay correctly
+    runs = []
+    for _ in range(2):
+        start_trace()
+        result = multiply(int_to_peano_str(250), int_to_peano_str(250))
+        runs.append((result, get_step_count(), get_trace_flat(max_depth=1)))
+    pinned = sum(steps for _, node, steps, _ in AXIOMS._memo.values() if node is not None)
+    bounded = pinned <= MEMO_MAX_STEPS < runs[0][1]
+    print(f"250 × 250 not pinned, {runs[0][1]} steps {'✓' if runs[0] == runs[1] and bounded else '✗'}")
+
+    print()
+
+def test_fast_math():
+    """Test that fast_math agrees with the recursive definitions"""
+    print("=== FAST MATH TESTS ===")
+
+    ops = [
+        ("+", add), ("×", multiply), ("-", subtract),
+        ("=", equal), ("<", less_than), (">", greater_than),
+        ("÷", div_peano), ("mod", mod_peano), ("gcd", gcd_peano)
+    ]
+    test_cases = [(0, 1), (1, 1), (3, 4), (7, 3), (12, 8), (9, 6), (5, 7)]
+
+    for symbol, op in ops:
+        for a, b in test_cases:
+            peano_a = int_to_peano_str(a)
+            peano_b = int_to_peano_str(b)
+            slow = op(peano_a, peano_b)
+            with fast_math_mode():
+                fast = op(peano_a, peano_b)
+            shown = fast if isinstance(fast, bool) else peano_str_to_int(fast)
+            print(f"{a} {symbol} {b} = {shown} {'✓' if fast == slow else '✗'}")
+
+    # add/multiply also report the step count of the full recursion
+    for symbol, op in ops[:2]:
+        for a, b in test_cases:
+            peano_a = int_to_peano_str(a)
+            peano_b = int_to_peano_str(b)
+            start_trace()
+            op(peano_a, peano_b)
+            slow_steps = get_step_count()
+            with fast_math_mode():
+                start_trace()
+                op(peano_a, peano_b)
+                fast_steps = get_step_count()
+            print(f"{a} {symbol} {b} steps: {fast_steps} {'✓' if fast_steps == slow_steps else '✗'}")
+
+    # gcd charges one step per Euclidean level it collapses
+    for a, b in test_cases:
+        peano_a = int_to_peano_str(a)
+        peano_b = int_to_peano_str(b)
+        start_trace()
+        gcd_peano(peano_a, peano_b)
+        levels = sum(1 for n in get_trace_flat() if n.op == "gcd")
+        with fast_math_mode():
+            start_trace()
+            gcd_peano(peano_a, peano_b)
+            fast_steps = get_step_count()
+        print(f"gcd({a}, {b}) steps: {fast_steps} {'✓' if fast_steps == levels else '✗'}")
+
+    # Clamped subtraction still raises the negative flag
+    for a, b in test_cases:
+        with fast_math_mode():
+            start_trace()
+            subtract(int_to_peano_str(a), int_to_peano_str(b))
+            flag = get_negative_flag()
+        print(f"{a} - {b} negative: {flag} {'✓' if flag == (b > a) else '✗'}")
+
+    # Another thread cannot switch fast_math off in the middle of a computation
+    seen = []
+
+    def switch_off():
+        with fast_math_mode(False):
+            seen.append(AXIOMS.fast_math)
+
+    other = threading.Thread(target=switch_off)
+    with fast_math_mode():
+        other.start()
+        other.join(timeout=0.2)
+        blocked = other.is_alive() and AXIOMS.fast_math
+    other.join()
+    print(f"fast_math held against other threads {'✓' if blocked and seen == [False] else '✗'}")
+
+    print()
+
+def test_trusted_input():
+    """Test that trust_input skips parsing checks without changing results"""
+    print("=== TRUSTED INPUT TESTS ===")
+
+    ops = [("+", add), ("×", multiply), ("-", subtract), ("÷", div_peano), ("gcd", gcd_peano)]
+    for symbol, op in ops:
+        peano_a = int_to_peano_str(12)
+        peano_b = int_to_peano_str(5)
+        checked = op(peano_a, peano_b)
+        with trusted_input():
+            trusted = op(peano_a, peano_b)
+        print(f"12 {symbol} 5 = {peano_str_to_int(trusted)} {'✓' if trusted == checked else '✗'}")
+
+    # A thread waiting on AXIOMS_LOCK still gets validation once trusted_input ends
+    errors = []
+
+    def parse_malformed():
+        with AXIOMS_LOCK:
+            try:
+                predecessor("s(abcd)")
+            except ValueError as exc:
+                errors.append(exc)
+
+    other = threading.Thread(target=parse_malformed)
+    with trusted_input():
+        other.start()
+        other.join(timeout=0.2)
+        blocked = other.is_alive()
+    other.join()
+    print(f"trusted_input held against other threads {'✓' if blocked and len(errors) == 1 else '✗'}")
+
+    # Validation still happens at the boundary
+    cases = [("s( s(0) )", True), ("s(0", False), ("x", False), ("s(abcd)", False), ("s(0)+s(0))", False)]
+    for term, valid in cases:
+        try:
+            AXIOMS.validate(term)
+            accepted = True
+        except ValueError:
+            accepted = False
+        print(f"validate({term!r}) accepted: {accepted} {'✓' if accepted == valid else '✗'}")
+
+    print()
+
+def test_app_requests():
+    """Test that form inputs whose intermediate terms are large still evaluate"""
+    print("=== APP REQUEST TESTS ===")
+
+    client = app.test_client()
+    # Small components, but the cross products summed by add are deep
+    cases = [((1, 40), (25, 1), (1001, 40)), ((1, 100), (100, 1), (10001, 100))]
+    for (a, b), (c, d), (num, den) in cases:
+        html = client.post("/", data={
+            "operation": "add_fractions", "input_mode": "fraction",
+            "x_num": a, "x_den": b, "y_num": c, "y_den": d,
+        }).get_data(as_text=True)
+        ok = ("alert-danger" not in html and f'<span class="num">{num}</span>' in html
+              and f'<span class="den">{den}</span>' in html)
+        print(f"{a}/{b} + {c}/{d} = {num}/{den} {'✓' if ok else '✗'}")
+
+    print()
+
 def test_edge_cases():
     """Test edge cases and boundary conditions"""
     print("=== EDGE CASE TESTS ===")
@@ -412,6 +608,10 @@ def run_all_tests():
     test_gcd()
     test_fractions()
     test_step_counting()
+    test_memo_replay()
+    test_fast_math()
+    test_trusted_input()
+    test_app_requests()
     test_edge_cases()
     
     print("🎉 ALL TESTS COMPLETED! 🎉")